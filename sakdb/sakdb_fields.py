@@ -10,22 +10,70 @@ __email__ = "ferawitt@gmail.com"
 
 import datetime
 import hashlib
+import io
 import json
-import uuid
-from typing import List, Optional
+import math
+import os
+import sys
+from json.encoder import encode_basestring_ascii
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
 
 PAYLOAD_SEPARATOR = "&"
+PAYLOAD_SEPARATOR_BYTES = PAYLOAD_SEPARATOR.encode("utf-8")
+MD5_PREFIX = "md5:"
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    # orjson is considerably faster, but it is strict about RFC 8259 (no NaN,
+    # no integers above 64 bits), so fallback to stdlib json in those cases.
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+if sys.version_info >= (3, 9):
+
+    def _md5_hexdigest(data: bytes) -> str:
+        # MD5 is only used for content addressing, skip the security policies.
+        return hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+else:
+
+    def _md5_hexdigest(data: bytes) -> str:
+        return hashlib.md5(data).hexdigest()
 
 
 def payload_md5(payload: str) -> str:
-    hash_object = hashlib.md5(bytes(payload, "utf-8"))
-    return "md5:" + hash_object.hexdigest()
+    return MD5_PREFIX + _md5_hexdigest(payload.encode("utf-8"))
+
+
+def _intern_key(key: str) -> str:
+    # Only the structural keys ("_cl", "_type", "_<name>:type" and the
+    # attribute names) repeat across the objects. The list and dict item
+    # keys ("<name>:<item key>") come from the user data, interning them would
+    # keep every distinct key alive for the whole process.
+    if key.startswith("_") or ":" not in key:
+        return sys.intern(key)
+    return key
+
+
+def field_timestamp() -> float:
+    return datetime.datetime.utcnow().timestamp()
 
 
 class SakDbField:
+    __slots__ = ("ts", "key", "_crc", "payload")
+
     ts: float
     key: str
-    crc: str
     payload: str
 
     def __init__(
@@ -38,89 +86,222 @@ class SakDbField:
         self.payload = payload
 
         if key is None:
-            self.key = uuid.uuid4().hex
+            self.key = os.urandom(16).hex()
         else:
-            self.key = key
+            # Keys repeat across the objects, share a single string for each.
+            self.key = _intern_key(key)
 
         if ts is None:
-            self.ts = datetime.datetime.utcnow().timestamp()
+            self.ts = field_timestamp()
         else:
             self.ts = ts
 
-        if crc is not None:
-            self.crc = crc
-        else:
-            self.crc = payload_md5(payload)
+        # The crc is only computed when it is needed.
+        self._crc: Optional[str] = crc
+
+    @property
+    def crc(self) -> str:
+        if self._crc is None:
+            self._crc = payload_md5(self.payload)
+        return self._crc
+
+    @crc.setter
+    def crc(self, crc: str) -> None:
+        self._crc = crc
+
+    @classmethod
+    def _from_parsed(cls, ts: float, key: str, crc: str, payload: str) -> "SakDbField":
+        # Fast path for fields read from the DB, all the values are known so
+        # skip the defaults resolution done in the constructor.
+        field = cls.__new__(cls)
+        field.ts = ts
+        field.key = key
+        field._crc = crc
+        field.payload = payload
+        return field
 
 
 class SakDbFields:
-    fields: List[SakDbField]
+    __slots__ = ("_fields", "_index")
 
-    def __init__(self, *fields: SakDbField) -> None:
-        self.fields: List[SakDbFields] = list(fields)
+    def __init__(
+        self, *fields: SakDbField, _fields: Optional[List[SakDbField]] = None
+    ) -> None:
+        # _fields takes the ownership of an already built list, without copying.
+        if _fields is not None:
+            self._fields: List[SakDbField] = _fields
+        else:
+            self._fields = list(fields)
+
+        # Lazy key -> field index, it is dropped every time the fields change.
+        self._index: Optional[Dict[str, SakDbField]] = None
+
+    @property
+    def fields(self) -> List[SakDbField]:
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields: List[SakDbField]) -> None:
+        self._fields = fields
+        self._index = None
+
+    def copy(self) -> "SakDbFields":
+        # The fields are copied too, since their timestamps can be updated.
+        return SakDbFields(
+            _fields=[
+                SakDbField._from_parsed(f.ts, f.key, f.crc, f.payload)
+                for f in self._fields
+            ]
+        )
+
+    def get_index(self) -> Dict[str, SakDbField]:
+        if self._index is None:
+            index: Dict[str, SakDbField] = {}
+            for field in self._fields:
+                # Keep the first field in case of repeated keys.
+                index.setdefault(field.key, field)
+            self._index = index
+        return self._index
 
     def get_by_key(self, key: str) -> Optional[SakDbField]:
-        for field in self.fields:
-            if field.key == key:
-                return field
-        return None
+        return self.get_index().get(key)
 
     def get_keys(self) -> List[str]:
-        ret = []
-        for field in self.fields:
-            ret.append(field.key)
-        return ret
+        return [field.key for field in self._fields]
 
-    def drop_by_key_prefix(self, key_prefix: str) -> None:
+    def drop_by_key_prefix(self, key_prefix: Union[str, Tuple[str, ...]]) -> None:
+        # Several prefixes can be dropped in a single pass over the fields.
         new_fields = [f for f in self.fields if not f.key.startswith(key_prefix)]
-        self.fields = new_fields
-
-
-def sakdb_loads(data: str) -> Optional[SakDbFields]:
-    ret = None
-
-    for line_idx, line in enumerate(data.splitlines()):
-        line = line.strip()
-        if not line:
+        if len(new_fields) != len(self._fields):
+            self.fields = new_fields
+
+
+def sakdb_loads(data: Union[str, bytes]) -> Optional[SakDbFields]:
+    # Work on the raw bytes (as stored in the blobs), the JSON parser decodes
+    # the UTF-8 itself, so there is no need to decode the whole data first.
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    fields: List[SakDbField] = []
+
+    # Only "\n" is used as line separator when dumping, all the other line
+    # breaks are escaped by the JSON encoder. The JSON parser ignores the
+    # surrounding whitespaces, so there is no need to strip the line parts.
+    for line in data.split(b"\n"):
+        header, separator, payload = line.partition(PAYLOAD_SEPARATOR_BYTES)
+        if not separator:
+            if line.strip():
+                raise Exception(
+                    f"Could not find the payload separator in {line.decode('utf-8')}"
+                )
             continue
 
-        header, payload = line.split(PAYLOAD_SEPARATOR, maxsplit=1)
-
-        parsed_header = json.loads(header)
-        parsed_payload = json.loads(payload)
+        parsed_header = json_loads(header)
+        parsed_payload = json_loads(payload)
 
-        if ret is None:
-            ret = SakDbFields()
-        ret.fields.append(
-            SakDbField(
-                ts=parsed_header["t"],
-                key=parsed_header["k"],
-                crc=parsed_header["c"],
-                payload=parsed_payload,
+        fields.append(
+            SakDbField._from_parsed(
+                parsed_header["t"],
+                # The same keys repeat across all the objects of a class.
+                _intern_key(parsed_header["k"]),
+                parsed_header["c"],
+                parsed_payload,
             )
         )
 
-    return ret
+    if not fields:
+        return None
+    return SakDbFields(_fields=fields)
+
+
+def _dumps_header(field: SakDbField) -> str:
+    # The header always has the same shape, so build the JSON directly. It
+    # matches json.dumps(..., separators=(",", ":")) byte by byte.
+    ts = field.ts
+    if type(ts) is float and math.isfinite(ts):
+        ts_str = float.__repr__(ts)
+    else:
+        ts_str = json.dumps(ts)
+
+    return (
+        '{"t":'
+        + ts_str
+        + ',"k":'
+        + encode_basestring_ascii(field.key)
+        + ',"c":'
+        + encode_basestring_ascii(field.crc)
+        + "}"
+    )
 
 
 def sakdb_dumps(data: SakDbFields) -> str:
-    ret = []
+    buffer = io.StringIO()
+    write = buffer.write
 
     for field in data.fields:
-        header = json.dumps(
-            {"t": field.ts, "k": field.key, "c": field.crc}, separators=(",", ":")
-        )
-        payload = json.dumps(field.payload, separators=(",", ":"))
+        header = _dumps_header(field)
+
+        if isinstance(field.payload, str):
+            payload = encode_basestring_ascii(field.payload)
+        else:
+            payload = json.dumps(field.payload, separators=(",", ":"))
 
         if PAYLOAD_SEPARATOR in header:
             raise Exception(
                 f'It is not allowed to have the "{PAYLOAD_SEPARATOR}" in the header'
             )
 
-        ret.append(header + PAYLOAD_SEPARATOR + payload)
+        # Every line ends with a new line to make the diffs easier.
+        write(header)
+        write(PAYLOAD_SEPARATOR)
+        write(payload)
+        write("\n")
+
+    return buffer.getvalue() or "\n"
+
+
+def _same_fields(
+    ours_index: Dict[str, SakDbField], theirs_index: Dict[str, SakDbField]
+) -> bool:
+    if len(ours_index) != len(theirs_index):
+        return False
+
+    for key, field in ours_index.items():
+        other = theirs_index.get(key)
+        if other is None or other.ts != field.ts or other.crc != field.crc:
+            return False
+    return True
+
+
+def _merge_latest(ours: SakDbFields, theirs: SakDbFields) -> List[SakDbField]:
+    new_fields: List[SakDbField] = []
 
-    # Add an extra new line to make the diffs easier.
-    return "\n".join(ret) + "\n"
+    ours_index = ours.get_index()
+    theirs_index = theirs.get_index()
+
+    # If both sides have exactly the same fields there is nothing to choose.
+    # The timestamp is part of the comparison, otherwise each replica would
+    # keep its own timestamp and the merges would never converge.
+    if _same_fields(ours_index, theirs_index):
+        return [ours_index[key] for key in sorted(ours_index)]
+
+    # Merge mode: Just accept the most recent.
+    for key in sorted(ours_index.keys() | theirs_index.keys()):
+        _ours = ours_index.get(key)
+        _theirs = theirs_index.get(key)
+
+        if (_ours is not None) and (_theirs is not None):
+            # If both are available, just choose the newest.
+            if _ours.ts > _theirs.ts:
+                new_fields.append(_ours)
+            else:
+                new_fields.append(_theirs)
+        elif _ours is not None:
+            new_fields.append(_ours)
+        elif _theirs is not None:
+            new_fields.append(_theirs)
+
+    return new_fields
 
 
 def merge(
@@ -129,55 +310,17 @@ def merge(
     theirs: Optional[SakDbFields],
 ) -> SakDbFields:
 
-    new_fields: List[SakDbField] = []
-
     # TODO(witt): Check everything that was removed.
-    # If there is a common base.
-    if base and ours and theirs:
-
-        # Merge mode: Just accept the most recent.
-        all_keys = set(ours.get_keys()).union(set(theirs.get_keys()))
-        for key in sorted(all_keys):
-            _ours = ours.get_by_key(key)
-            _theirs = theirs.get_by_key(key)
-
-            if (_ours is not None) and (_theirs is not None):
-                # If both are available, just choose the newest.
-                if _ours.ts > _theirs.ts:
-                    new_fields.append(_ours)
-                else:
-                    new_fields.append(_theirs)
-            elif _ours is not None:
-                new_fields.append(_ours)
-            elif _theirs is not None:
-                new_fields.append(_theirs)
-
-    # If not common base.
-    if (base is None) and ours and theirs:
-
-        # Merge mode: Just accept the most recent.
-        all_keys = set(ours.get_keys()).union(set(theirs.get_keys()))
-        for key in sorted(all_keys):
-            _ours = ours.get_by_key(key)
-            _theirs = theirs.get_by_key(key)
-
-            if (_ours is not None) and (_theirs is not None):
-                # If both are available, just choose the newest.
-                if _ours.ts > _theirs.ts:
-                    new_fields.append(_ours)
-                else:
-                    new_fields.append(_theirs)
-            elif _ours is not None:
-                new_fields.append(_ours)
-            elif _theirs is not None:
-                new_fields.append(_theirs)
+    # With or without a common base, if both sides are available merge them.
+    if (ours is not None) and (theirs is not None):
+        return SakDbFields(_fields=_merge_latest(ours, theirs))
 
     # If only ours.
-    if (base is None) and ours and (theirs is None):
-        new_fields = ours.fields
+    if (base is None) and (ours is not None):
+        return SakDbFields(_fields=ours.fields[:])
 
     # If only theirs.
-    if (base is None) and (ours is None) and theirs:
-        new_fields = theirs.fields
+    if (base is None) and (theirs is not None):
+        return SakDbFields(_fields=theirs.fields[:])
 
-    return SakDbFields(*new_fields)
+    return SakDbFields()
@@ -8,23 +8,53 @@ __license__ = "MIT"
 __maintainer__ = "Fernando Witt"
 __email__ = "ferawitt@gmail.com"
 
-import functools
 import json
+import os
 import traceback
 import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, TypeVar
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
 
 import pygit2
 
-from sakdb.sakdb_fields import SakDbField, SakDbFields, merge, sakdb_dumps, sakdb_loads
+from sakdb.sakdb_fields import (
+    SakDbField,
+    SakDbFields,
+    field_timestamp,
+    json_loads,
+    merge,
+    sakdb_dumps,
+    sakdb_loads,
+)
 
 VERSION = "0.1.0"
 
+# Number of parsed blobs kept in memory by each git namespace.
+FIELDS_CACHE_SIZE = 1024
+
+# Number of resolved (commit, path) -> blob lookups kept by each git namespace.
+BLOBS_CACHE_SIZE = 4096
+
 _T = TypeVar("_T")
 _KT = TypeVar("_KT")
 _VT = TypeVar("_VT")
 
+# Number of commit -> root tree lookups kept by each git namespace.
+TREES_CACHE_SIZE = 64
+
+# Commit id and path of a blob in the commit tree.
+_BlobKey = Tuple[pygit2.Oid, Path]
+
+
+def _keep_unchanged_timestamps(previous: SakDbFields, value: SakDbFields) -> None:
+    # Fields with the same content keep the previous timestamp.
+    value_index = value.get_index()
+    for prev_field in previous.fields:
+        new_field = value_index.get(prev_field.key)
+        if new_field is not None and new_field.crc == prev_field.crc:
+            new_field.ts = prev_field.ts
+
 
 class SakDbSessionChanges(object):
     def __init__(self, namespace: "SakDbNamespace") -> None:
@@ -38,23 +68,14 @@ class SakDbSessionChanges(object):
         self.changes.clear()
 
     def read(self, path: Path) -> Optional["SakDbFields"]:
-        if str(path) not in self.changes:
-            return None
-        return self.changes[str(path)]
+        return self.changes.get(str(path))
 
     def write(self, path: Path, value: SakDbFields) -> None:
         previous_value = self.read(path)
 
         # Do not update timestamp if the content didn't change.
         if previous_value is not None:
-            for prev_field in previous_value.fields:
-                new_field = value.get_by_key(prev_field.key)
-
-                if new_field is None:
-                    continue
-
-                if new_field.crc == prev_field.crc:
-                    new_field.ts = prev_field.ts
+            _keep_unchanged_timestamps(previous_value, value)
 
         self.changes[str(path)] = merge(None, value, previous_value)
 
@@ -155,6 +176,16 @@ class SakDbGraph(object):
         self.namespaces: Dict[str, "SakDbNamespace"] = {}
         self.classes: Dict[str, type] = {}
 
+        # Index of object key -> object for all the namespaces.
+        self._object_index: Dict[str, "SakDbObject"] = {}
+
+        # The encoder and decoder are stateless, so share them.
+        self.encoder = SakDbEncoder()
+        self.decoder = SakDbDecoder(self)
+
+        # Repositories opened by the git namespaces, by absolute path.
+        self._repositories: Dict[str, pygit2.Repository] = {}
+
         self.current_session: Optional[SakDbSession] = None
 
     def has_namespace_registered(self, name: str) -> bool:
@@ -165,7 +196,24 @@ class SakDbGraph(object):
             self.namespaces[namespace.name] = namespace
         namespace.register_graph(self)
 
+    def open_repository(self, path: Path) -> pygit2.Repository:
+        # The namespaces of the graph in the same path share the repository.
+        key = os.path.abspath(path)
+        repo = self._repositories.get(key)
+        if repo is None:
+            repo = pygit2.init_repository(path, True)
+            self._repositories[key] = repo
+        return repo
+
+    def register_object(self, obj: "SakDbObject") -> None:
+        if obj.key not in self._object_index:
+            self._object_index[obj.key] = obj
+
     def get_object(self, key: str) -> Optional["SakDbObject"]:
+        obj = self._object_index.get(key)
+        if obj is not None:
+            return obj
+
         for n in self.namespaces.values():
             obj = n.get_object(key)
             if obj is not None:
@@ -173,7 +221,10 @@ class SakDbGraph(object):
         return None
 
     def register_class(self, cl: type) -> None:
-        if cl.__name__ in self.classes:
+        registered_cl = self.classes.get(cl.__name__)
+        if registered_cl is cl:
+            return
+        if registered_cl is not None:
             raise Exception(f"The class {cl.__name__} has been already registered")
         self.classes[cl.__name__] = cl
 
@@ -181,9 +232,9 @@ class SakDbGraph(object):
         return self.classes[clname]
 
     def get_objects(self) -> List["SakDbObject"]:
-        ret = []
+        ret: List["SakDbObject"] = []
         for n in self.namespaces.values():
-            ret += list(n.get_objects())
+            ret += n.get_objects()
         return ret
 
     def session(self, name: str = "sakdbsession", msg: str = "Update") -> SakDbSession:
@@ -201,6 +252,21 @@ class SakDbNamespace(object):
 
         self.objects: Dict[str, Optional["SakDbObject"]] = {}
 
+        # The class of an object never changes, so keep the class of the keys
+        # already resolved to avoid reading their "_cl" again.
+        self._object_classes: Dict[str, type] = {}
+
+        # Key -> class name of the objects whose "_cl" is known to be written
+        # (stored or pending in the session), so it is not read again.
+        self._cl_saved: Dict[str, str] = {}
+
+        # Cache of node key -> node path, it is built on every read/write.
+        self._node_paths: Dict[str, Path] = {}
+
+        # Same for the data paths, reusing the Path objects also reuses their
+        # cached string representation (used as key by the sessions).
+        self._data_paths: Dict[Tuple[str, str], Path] = {}
+
         self.graph: Optional["SakDbGraph"] = graph
         self.register_graph(graph)
 
@@ -225,15 +291,17 @@ class SakDbNamespace(object):
         raise Exception("Not implemented")
 
     def get_object_keys(self) -> Set[str]:
-        # TODO: Use generators for this.
         self.populate_object_keys()
-        return set(self.objects.keys())
+        return set(self.objects)
+
+    def iter_object_keys(self) -> Iterator[str]:
+        self.populate_object_keys()
+        # The keys are already unique, iterate over a snapshot of them since
+        # getting the objects can register new ones.
+        yield from tuple(self.objects)
 
     def get_objects(self) -> List["SakDbObject"]:
-        ret = []
-        for key in self.get_object_keys():
-            ret.append(self.get_object(key))
-        return ret
+        return [self.get_object(key) for key in self.iter_object_keys()]
 
     def get_object(self, key: str) -> "SakDbObject":
         # Check if there is already this key in the graph, then return it.
@@ -244,7 +312,21 @@ class SakDbNamespace(object):
                 return obj
 
         # Choose the proper class and then instantiate this specific class.
-        cl_fields = self.read(key, "_cl")
+        cl = self._get_object_class(key)
+        obj = cl(self, key)
+
+        if not isinstance(obj, SakDbObject):
+            raise Exception(f"Object {obj} should be an instance of SakDbObject")
+
+        self.register_object(obj)
+        return obj
+
+    def _get_object_class(self, key: str) -> type:
+        cl = self._object_classes.get(key)
+        if cl is not None:
+            return cl
+
+        cl_fields = self.read(key, "_cl", copy=False)
         if cl_fields is None:
             raise Exception(f"Failed to read the class type for object {key}")
 
@@ -257,28 +339,31 @@ class SakDbNamespace(object):
 
         if self.graph is None:
             raise Exception(f"No graph registered for namespace {self.name}!")
-        else:
-            cl = self.graph.get_class(clname)
-            if cl is None:
-                raise Exception(f"Class {clname} is not supported")
-            else:
-                obj = cl(self, key)
 
-                if not isinstance(obj, SakDbObject):
-                    raise Exception(
-                        f"Object {obj} should be an instance of SakDbObject"
-                    )
+        cl = self.graph.get_class(clname)
+        if cl is None:
+            raise Exception(f"Class {clname} is not supported")
 
-                self.register_object(obj)
-                return obj
+        self._object_classes[key] = cl
+        return cl
 
-    def has_object(self, key: str) -> bool:
+    def contains_object(self, key: str) -> bool:
         self.populate_object_keys()
         return key in self.objects
 
+    def has_object(self, key: str) -> bool:
+        if key in self.objects:
+            return True
+        return self.contains_object(key)
+
     def register_object(self, obj: "SakDbObject") -> None:
-        if not self.has_object(obj.key):
+        # The keys listed from the DB are populated with None, so they are
+        # replaced as well. No need to look for the key in the DB.
+        if self.objects.get(obj.key) is None:
             self.objects[obj.key] = obj
+        self._object_classes[obj.key] = type(obj)
+        if self.graph is not None:
+            self.graph.register_object(obj)
 
     def get_version(self) -> Optional[str]:
         ret = self.get_metadata("version")
@@ -289,7 +374,7 @@ class SakDbNamespace(object):
         return ret
 
     def read_sakdb(
-        self, path: Path, branch: Optional[str] = None
+        self, path: Path, branch: Optional[str] = None, copy: bool = True
     ) -> Optional[SakDbFields]:
         # Try to read from the Session, if not available read from the disk.
         if self.graph is not None:
@@ -299,28 +384,41 @@ class SakDbNamespace(object):
                 if session_value is not None:
                     return session_value
 
-        value_str = self._read(path, branch)
-        if value_str is None:
-            return None
-        return sakdb_loads(value_str)
-
-    def read(self, node_key: str, data_key: str) -> Optional[SakDbFields]:
-        node_path = (
-            Path(self.name)
-            / "objects"
-            / node_key[0]
-            / node_key[1]
-            / node_key[2]
-            / node_key[3]
-            / node_key
-        )
-        data_path = node_path / data_key
-        return self.read_sakdb(data_path)
+        return self._read_sakdb(path, branch, copy)
+
+    def _node_path(self, node_key: str) -> Path:
+        node_path = self._node_paths.get(node_key)
+        if node_path is None:
+            node_path = (
+                Path(self.name)
+                / "objects"
+                / node_key[0]
+                / node_key[1]
+                / node_key[2]
+                / node_key[3]
+                / node_key
+            )
+            self._node_paths[node_key] = node_path
+        return node_path
+
+    def _data_path(self, node_key: str, data_key: str) -> Path:
+        data_path = self._data_paths.get((node_key, data_key))
+        if data_path is None:
+            data_path = self._node_path(node_key) / data_key
+            self._data_paths[(node_key, data_key)] = data_path
+        return data_path
+
+    def read(
+        self, node_key: str, data_key: str, copy: bool = True
+    ) -> Optional[SakDbFields]:
+        # Use copy=False only to inspect the fields, never to change them.
+        data_path = self._data_path(node_key, data_key)
+        return self.read_sakdb(data_path, copy=copy)
 
     def get_metadata(self, key: str, branch: Optional[str] = None) -> Any:
         metada_path = Path(self.name) / "metadata" / key
 
-        data = self.read_sakdb(metada_path)
+        data = self.read_sakdb(metada_path, copy=False)
         if data is None:
             raise Exception(f"Could not load the entry {key} from metadata DB")
 
@@ -328,7 +426,7 @@ class SakDbNamespace(object):
         if object_field is None:
             raise Exception(f"No attribute {key} for {self}.")
 
-        value = json.loads(object_field.payload)
+        value = json_loads(object_field.payload)
         return value
 
     def write_sakdb(self, path: Path, value: SakDbFields) -> None:
@@ -345,40 +443,28 @@ class SakDbNamespace(object):
         session.write_to_session(self, path, value)
 
     def session_apply_sakdb(self, path: Path, value: SakDbFields) -> None:
-        # Check if content changed, if not do not update the timestamps.
-        prev_value = self.read_sakdb(path)
+        # Check if content changed, if not do not update the timestamps. Read
+        # what is stored, the session would only return this same value.
+        prev_value = self._read_sakdb(path, copy=False)
         if prev_value is not None:
-            for prev_field in prev_value.fields:
-                new_field = value.get_by_key(prev_field.key)
-
-                if new_field is None:
-                    continue
-
-                if new_field.crc == prev_field.crc:
-                    new_field.ts = prev_field.ts
+            _keep_unchanged_timestamps(prev_value, value)
 
         # Dump sanitized timestamp value to the low level.
         value_str = sakdb_dumps(value)
         self._write(path, value_str)
 
     def write(self, node_key: str, data_key: str, value: SakDbFields) -> None:
-        node_path = (
-            Path(self.name)
-            / "objects"
-            / node_key[0]
-            / node_key[1]
-            / node_key[2]
-            / node_key[3]
-            / node_key
-        )
-        data_path = node_path / data_key
+        data_path = self._data_path(node_key, data_key)
         self.write_sakdb(data_path, value)
 
     def set_metadata(self, key: str, value: Any) -> None:
         metada_path = Path(self.name) / "metadata" / key
 
-        encoder = SakDbEncoder()
-        payload_str = json.dumps(value, default=encoder.default, separators=(",", ":"))
+        if self.graph is None:
+            raise Exception("It is necessary to have a graph to perform the write")
+
+        encoder = self.graph.encoder
+        payload_str = encoder.encode(value)
 
         data = SakDbFields(
             SakDbField(key="_type", payload=type(value).__name__),
@@ -399,6 +485,14 @@ class SakDbNamespace(object):
     def close_session(self, name: str, msg: str) -> None:
         raise Exception("Not implemented")
 
+    def _read_sakdb(
+        self, path: Path, branch: Optional[str] = None, copy: bool = True
+    ) -> Optional[SakDbFields]:
+        value_str = self._read(path, branch)
+        if value_str is None:
+            return None
+        return sakdb_loads(value_str)
+
     def _read(self, path: Path, branch: Optional[str] = None) -> Optional[str]:
         raise Exception("Not implemented")
 
@@ -411,19 +505,41 @@ class SakDbNamespaceGit(SakDbNamespace):
         self, graph: "SakDbGraph", name: str, path: Path, branch: str = "master"
     ) -> None:
         super(SakDbNamespaceGit, self).__init__(graph, name)
-        self.repo = pygit2.init_repository(path, True)
+        self.repo = graph.open_repository(path)
 
         self.namespace_branch = branch
         self.namespace_ref = f"refs/heads/{branch}"
 
         self._last_hash_for_populated_objs: str = ""
+        self._last_tree_for_populated_objs: Optional[pygit2.Oid] = None
+        self._populated_prefix_trees: Dict[str, pygit2.Oid] = {}
 
         self._current_session_index: Optional[pygit2.Index] = None
         self._current_session_branch: Optional[str] = None
 
+        # Index of the last closed session and the tree it represents, it is
+        # reused by the next session if the namespace branch has that tree.
+        self._last_session_index: Optional[pygit2.Index] = None
+        self._last_session_tree: Optional[pygit2.Oid] = None
+
+        # Parsed blobs, the blob id is the content hash so it never gets stale.
+        self._fields_cache: "OrderedDict[pygit2.Oid, SakDbFields]" = OrderedDict()
+
+        # Blobs found by walking the tree of a commit, a commit never changes
+        # so the entries are still valid after the branches move.
+        self._blobs_cache: "OrderedDict[_BlobKey, Optional[pygit2.Object]]" = (
+            OrderedDict()
+        )
+
+        # Name and email of the commits, read from the git config once.
+        self._signature_identity: Optional[Tuple[str, str]] = None
+
+        # Root tree of the commits, a commit never changes its tree.
+        self._trees_cache: "OrderedDict[pygit2.Oid, pygit2.Tree]" = OrderedDict()
+
         if self.namespace_ref not in self.repo.references:
             # author = pygit2.Signature("a b", "a@b")
-            author = self.repo.default_signature
+            author = self._signature()
             committer = author
             commit_message = "Initial commit"
 
@@ -452,6 +568,18 @@ class SakDbNamespaceGit(SakDbNamespace):
             with self.graph.session(msg="Set version"):
                 self.set_metadata("version", VERSION)
 
+    def refresh_signature(self) -> None:
+        self._signature_identity = None
+
+    def _signature(self) -> pygit2.Signature:
+        if self._signature_identity is None:
+            signature = self.repo.default_signature
+            self._signature_identity = (signature.name, signature.email)
+
+        # Build a new signature so the commit gets the current time.
+        name, email = self._signature_identity
+        return pygit2.Signature(name, email)
+
     def add_remote(self, name: str, url: str) -> pygit2.remote.Remote:
         # TODO(witt): What if remote already exists?
         return self.repo.remotes.create(name, url)
@@ -478,17 +606,15 @@ class SakDbNamespaceGit(SakDbNamespace):
 
                 base = None
                 if base_index is not None:
-                    base = sakdb_loads(self.repo[base_index.oid].data.decode("utf-8"))
+                    base = sakdb_loads(self.repo[base_index.oid].data)
                     path = Path(base_index.path)
                 ours = None
                 if ours_index is not None:
-                    ours = sakdb_loads(self.repo[ours_index.oid].data.decode("utf-8"))
+                    ours = sakdb_loads(self.repo[ours_index.oid].data)
                     path = Path(ours_index.path)
                 theirs = None
                 if theirs_index is not None:
-                    theirs = sakdb_loads(
-                        self.repo[theirs_index.oid].data.decode("utf-8")
-                    )
+                    theirs = sakdb_loads(self.repo[theirs_index.oid].data)
                     path = Path(theirs_index.path)
 
                 merged = merge(base, ours, theirs)
@@ -503,7 +629,7 @@ class SakDbNamespaceGit(SakDbNamespace):
 
                 del merged_index.conflicts[str(path)]
 
-        user = self.repo.default_signature
+        user = self._signature()
         tree = merged_index.write_tree()
         message = f"Merge {theirs_branch.name}"
 
@@ -518,8 +644,9 @@ class SakDbNamespaceGit(SakDbNamespace):
         )
 
     def sync(self, remotes: List[str] = []) -> None:
+        # Prune, so the remote tracking refs only have what the remotes hold.
         for remote in self.repo.remotes:
-            remote.fetch()
+            remote.fetch(prune=pygit2.GIT_FETCH_PRUNE)
 
         for branch_name in self.repo.branches.local:
             branch = self.repo.branches[branch_name]
@@ -564,9 +691,47 @@ class SakDbNamespaceGit(SakDbNamespace):
             branch.set_target(synced_branch.target)
 
             for remote in self.repo.remotes:
+                # Nothing to send if the remote (as just fetched) has this tip.
+                remote_ref = self.repo.references.get(
+                    f"refs/remotes/{remote.name}/{synced_branch_name}"
+                )
+                if remote_ref is not None and remote_ref.target == synced_branch.target:
+                    continue
+
                 remote.push([synced_branch.name])
                 remote.fetch()
 
+    def sync_bidir(self, peer: "SakDbNamespaceGit") -> None:
+        # Both namespaces must have each other as remote. After syncing this
+        # one and then the peer, the peer already pushed the converged synced
+        # branches here, so only the local branches are left to be moved.
+        self.sync()
+        peer.sync()
+
+        for branch_name in self.repo.branches.local:
+            if branch_name.startswith("synced/"):
+                continue
+
+            synced_branch_name = f"synced/{branch_name}"
+            if synced_branch_name not in self.repo.branches:
+                continue
+
+            branch = self.repo.branches[branch_name]
+            synced_branch = self.repo.branches[synced_branch_name]
+            self.do_merge(synced_branch, branch)
+
+            synced_branch = self.repo.branches[synced_branch_name]
+            branch.set_target(synced_branch.target)
+
+    def _iter_object_keys(self, prefix_tree: pygit2.Tree) -> Iterator[str]:
+        # The entries of a tree are already the sub trees, so iterate them
+        # directly instead of looking each one up again in the repository.
+        for obj2 in prefix_tree:
+            for obj3 in obj2:
+                for obj4 in obj3:
+                    for obj5 in obj4:
+                        yield obj5.name
+
     def populate_object_keys(self) -> None:
         namespace_ref = self.repo.references[self.namespace_ref].target
 
@@ -574,51 +739,128 @@ class SakDbNamespaceGit(SakDbNamespace):
             return
         self._last_hash_for_populated_objs = namespace_ref
 
-        tree = self.repo[namespace_ref].tree[self.name]
+        tree = self._commit_tree(namespace_ref)[self.name]
 
         if "objects" not in tree:
             return
 
         # TODO(witt): Is there a better way of walking through the tree?
         tree = tree["objects"]
-        for obj in tree:
-            if obj.type_str == "tree":
-                for obj2 in self.repo[obj.id]:
-                    for obj3 in self.repo[obj2.id]:
-                        for obj4 in self.repo[obj3.id]:
-                            for obj5 in self.repo[obj4.id]:
-                                key = obj5.name
-                                if key not in self.objects:
-                                    self.objects[key] = None
+
+        # Commits that didn't touch the objects (e.g. metadata) keep the tree.
+        if self._last_tree_for_populated_objs == tree.id:
+            return
+        self._last_tree_for_populated_objs = tree.id
+
+        for prefix_tree in tree:
+            if prefix_tree.type_str != "tree":
+                continue
+
+            # Only walk the prefixes that changed since the last time.
+            if self._populated_prefix_trees.get(prefix_tree.name) == prefix_tree.id:
+                continue
+
+            for key in self._iter_object_keys(prefix_tree):
+                if key not in self.objects:
+                    self.objects[key] = None
+
+            self._populated_prefix_trees[prefix_tree.name] = prefix_tree.id
+
+    def contains_object(self, key: str) -> bool:
+        # The keys shorter than the prefix levels cannot be in the tree.
+        if len(key) < 4:
+            return False
+
+        # Only walk the path of this object instead of listing all of them.
+        node = self._read_blob(self.namespace_ref, self._node_path(key))
+        return node is not None
+
+    def _commit_tree(self, commit_id: pygit2.Oid) -> pygit2.Tree:
+        tree = self._trees_cache.get(commit_id)
+        if tree is None:
+            tree = self.repo[commit_id].tree
+            self._trees_cache[commit_id] = tree
+            if len(self._trees_cache) > TREES_CACHE_SIZE:
+                self._trees_cache.popitem(last=False)
+        else:
+            self._trees_cache.move_to_end(commit_id)
+        return tree
 
     def _read_blob(self, ref: str, path: Path) -> Optional[pygit2.Object]:
         try:
-            path_parts = path.parts
-
             branch_ref = self.repo.references[ref].target
-            tree = self.repo[branch_ref].tree
+        except Exception:
+            return None
 
-            current_node = tree
-            for ipath in path_parts:
-                current_node = current_node[ipath]
+        cache_key = (branch_ref, path)
+        if cache_key in self._blobs_cache:
+            self._blobs_cache.move_to_end(cache_key)
+            return self._blobs_cache[cache_key]
 
-            return current_node
+        current_node: Optional[pygit2.Object]
+        try:
+            current_node = self._commit_tree(branch_ref)
+            for ipath in path.parts:
+                current_node = current_node[ipath]
         except Exception:
             # Exception("Could not read {path} in {self}.")
-            return None
+            current_node = None
 
-    def _read(self, path: Path, branch: Optional[str] = None) -> Optional[str]:
-        blob: Optional[pygit2.Object] = None
+        self._blobs_cache[cache_key] = current_node
+        if len(self._blobs_cache) > BLOBS_CACHE_SIZE:
+            self._blobs_cache.popitem(last=False)
+
+        return current_node
 
+    def _find_blob(
+        self, path: Path, branch: Optional[str] = None
+    ) -> Optional[pygit2.Object]:
         if branch is not None:
             # Try in session index.
-            blob = self._read_blob(branch, path)
+            return self._read_blob(branch, path)
+        elif self._current_session_index is not None:
+            # The session index has the content of the session branch plus the
+            # pending writes, a lookup there is a binary search by path instead
+            # of a walk through the trees.
+            try:
+                entry = self._current_session_index[str(path)]
+            except KeyError:
+                return None
+            return self.repo[entry.id]
         elif self._current_session_branch is not None:
-            # Try in session index.
-            blob = self._read_blob(f"refs/heads/{self._current_session_branch}", path)
+            # Try in session branch.
+            return self._read_blob(f"refs/heads/{self._current_session_branch}", path)
         else:
             # Try in namespace branch.
-            blob = self._read_blob(f"refs/heads/{self.namespace_branch}", path)
+            return self._read_blob(f"refs/heads/{self.namespace_branch}", path)
+
+    def _read_sakdb(
+        self, path: Path, branch: Optional[str] = None, copy: bool = True
+    ) -> Optional[SakDbFields]:
+        blob = self._find_blob(path, branch)
+        if blob is None:
+            return None
+
+        fields = self._fields_cache.get(blob.id)
+        if fields is None:
+            fields = sakdb_loads(blob.data)
+            if fields is None:
+                return None
+
+            self._fields_cache[blob.id] = fields
+            if len(self._fields_cache) > FIELDS_CACHE_SIZE:
+                self._fields_cache.popitem(last=False)
+        else:
+            self._fields_cache.move_to_end(blob.id)
+
+        # Callers are allowed to change what they read, so only share it when
+        # they asked for it.
+        if copy:
+            return fields.copy()
+        return fields
+
+    def _read(self, path: Path, branch: Optional[str] = None) -> Optional[str]:
+        blob = self._find_blob(path, branch)
 
         if blob is not None:
             ret = blob.data.decode("utf-8")
@@ -631,26 +873,20 @@ class SakDbNamespaceGit(SakDbNamespace):
             return None
 
     def _write(self, path: Path, value: str) -> None:
+        if self._current_session_index is None:
+            raise Exception("There should be a index setup")
 
+        # The value is hashed only once, libgit2 does not write the object
+        # again if it is already stored.
         blob = self.repo.create_blob(value)
 
-        # Check if the blob is identical, then just return.
-        previous_blob: Optional[pygit2.Object] = None
-        if self._current_session_branch is not None:
-            # Try in session index.
-            previous_blob = self._read_blob(
-                f"refs/heads/{self._current_session_branch}", path
-            )
-        else:
-            # Try in namespace branch.
-            previous_blob = self._read_blob(f"refs/heads/{self.namespace_branch}", path)
-
-        if previous_blob is not None:
-            if blob == previous_blob.oid:
+        # Check if the blob is identical, then just return. The index entry
+        # has the id, there is no need to load the previous blob.
+        try:
+            if self._current_session_index[str(path)].id == blob:
                 return
-
-        if self._current_session_index is None:
-            raise Exception("There should be a index setup")
+        except KeyError:
+            pass
 
         new_entry = pygit2.IndexEntry(str(path), blob, pygit2.GIT_FILEMODE_BLOB)
 
@@ -676,12 +912,19 @@ class SakDbNamespaceGit(SakDbNamespace):
         # Store the session branch and index.
         self._current_session_branch = session_branch
 
-        self._current_session_index = pygit2.Index()
-
-        # Populate the index with the content of the namespace branch.
         namespace_ref = self.repo.references[self.namespace_ref].target
-        tree = self.repo[namespace_ref].tree
-        self._current_session_index.read_tree(tree)
+        tree = self._commit_tree(namespace_ref)
+
+        if self._last_session_index is not None and self._last_session_tree == tree.id:
+            # The index already has the content of the namespace branch.
+            self._current_session_index = self._last_session_index
+        else:
+            # Populate the index with the content of the namespace branch.
+            self._current_session_index = pygit2.Index()
+            self._current_session_index.read_tree(tree)
+
+        self._last_session_index = None
+        self._last_session_tree = None
 
     def close_session(self, name: str, msg: str) -> None:
         if self._current_session_branch is None:
@@ -696,10 +939,18 @@ class SakDbNamespaceGit(SakDbNamespace):
         branch = self.repo.branches[self.namespace_branch]
         session_branch = self.repo.branches[self._current_session_branch]
 
+        # After the final commit the index has the tree of the session branch.
+        # It only matches the namespace branch if no one else moved it, the
+        # next session checks that before reusing the index.
+        session_tree = self._commit_tree(session_branch.target).id
+
         self.do_merge(branch, session_branch)
 
         self.repo.branches.delete(self._current_session_branch)
 
+        self._last_session_index = self._current_session_index
+        self._last_session_tree = session_tree
+
         self._current_session_index = None
         self._current_session_branch = None
 
@@ -716,11 +967,14 @@ class SakDbNamespaceGit(SakDbNamespace):
 
         # Reset the index.
         namespace_ref = self.repo.references[self.namespace_ref].target
-        tree = self.repo[namespace_ref].tree
+        tree = self._commit_tree(namespace_ref)
 
         self._current_session_index = pygit2.Index()
         self._current_session_index.read_tree(tree)
 
+        # Some of the classes may only have been written in the session.
+        self._cl_saved.clear()
+
     def commit(self, msg: str) -> None:
 
         if self._current_session_index is None:
@@ -736,12 +990,12 @@ class SakDbNamespaceGit(SakDbNamespace):
         # The session branch.
         session_ref_str = f"refs/heads/{self._current_session_branch}"
         session_ref = self.repo.references[session_ref_str].target
-        tree = self.repo[session_ref].tree
+        tree = self._commit_tree(session_ref)
 
         # If the tree id is different, then commit it.
         if tid != tree.id:
             # author = pygit2.Signature("a b", "a@b")
-            author = self.repo.default_signature
+            author = self._signature()
             committer = author
             commit_message = msg
 
@@ -752,7 +1006,21 @@ class SakDbNamespaceGit(SakDbNamespace):
 
 class SakDbEncoder(json.JSONEncoder):
     def __init__(self) -> None:
-        super(SakDbEncoder, self).__init__()
+        # Same output as json.dumps(..., separators=(",", ":")), but calling
+        # encode on a reused instance avoids creating an encoder per value.
+        super(SakDbEncoder, self).__init__(separators=(",", ":"))
+
+    def encode(self, value: Any) -> str:
+        # Most of the attributes are scalars, skip the generic encoding for
+        # them. The output is the same as the one from JSONEncoder.
+        value_type = type(value)
+        if value_type is int:
+            return int.__repr__(value)
+        elif value_type is bool:
+            return "true" if value else "false"
+        elif value is None:
+            return "null"
+        return super(SakDbEncoder, self).encode(value)
 
     def default(self, value: Any) -> Any:
         if isinstance(value, SakDbObject):
@@ -776,6 +1044,25 @@ class SakDbDecoder(object):
                 return self.graph.get_object(value["key"])
         return value
 
+    def resolve(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            value = {k: self.resolve(v) for k, v in value.items()}
+            return self.object_hook(value)
+        elif isinstance(value, list):
+            return [self.resolve(v) for v in value]
+        return value
+
+    def decode(self, payload: str) -> Any:
+        value = json_loads(payload)
+
+        # Only payloads with references to other objects need to be walked.
+        if '"_type"' not in payload:
+            return value
+
+        # The fast parser has no object hook, so the references to other
+        # objects are resolved after the parsing.
+        return self.resolve(value)
+
 
 class SakDbList(list):  # type: ignore
     def __init__(
@@ -785,32 +1072,50 @@ class SakDbList(list):  # type: ignore
         self._obj = obj
         self._obj_name = obj_name
 
-    def __getattribute__(self, key: str) -> Any:
-        if key in [
-            "__setitem__",
-            "append",
-            "extend",
-            "insert",
-            "remove",
-            "pop",
-            "clear",
-            "sort",
-            "reverse",
-        ]:
-            func = super(SakDbList, self).__getattribute__(key)
-
-            @functools.wraps(func)
-            def wrapper(*args: Any, **vargs: Any) -> Any:
-                ret = func(*args, **vargs)
-                setattr(self._obj, self._obj_name, self)
-                return ret
-
-            return wrapper
-        return super(SakDbList, self).__getattribute__(key)
+    # Every method that changes the list stores it back in the object.
+    def _store(self) -> None:
+        setattr(self._obj, self._obj_name, self)
 
-    def __setitem__(self, key: int, item: Any) -> None:  # type: ignore
+    def __setitem__(self, key: Any, item: Any) -> None:
         super(SakDbList, self).__setitem__(key, item)
-        setattr(self._obj, self._obj_name, self)
+        self._store()
+
+    def __delitem__(self, key: Any) -> None:
+        super(SakDbList, self).__delitem__(key)
+        self._store()
+
+    def append(self, item: Any) -> None:
+        super(SakDbList, self).append(item)
+        self._store()
+
+    def extend(self, items: Any) -> None:
+        super(SakDbList, self).extend(items)
+        self._store()
+
+    def insert(self, index: Any, item: Any) -> None:
+        super(SakDbList, self).insert(index, item)
+        self._store()
+
+    def remove(self, item: Any) -> None:
+        super(SakDbList, self).remove(item)
+        self._store()
+
+    def pop(self, *args: Any) -> Any:
+        ret = super(SakDbList, self).pop(*args)
+        self._store()
+        return ret
+
+    def clear(self) -> None:
+        super(SakDbList, self).clear()
+        self._store()
+
+    def sort(self, **vargs: Any) -> None:
+        super(SakDbList, self).sort(**vargs)
+        self._store()
+
+    def reverse(self) -> None:
+        super(SakDbList, self).reverse()
+        self._store()
 
 
 class SakDbDict(Dict[_KT, _VT]):
@@ -819,26 +1124,30 @@ class SakDbDict(Dict[_KT, _VT]):
         self._obj = obj
         self._obj_name = obj_name
 
-    def __getattribute__(self, key: str) -> Any:
-        if key in ["clear", "update", "pop"]:
-            func = super(SakDbDict, self).__getattribute__(key)
-
-            @functools.wraps(func)
-            def wrapper(*args: Any, **vargs: Any) -> Any:
-                ret = func(*args, **vargs)
-                setattr(self._obj, self._obj_name, self)
-                return ret
-
-            return wrapper
-        return super(SakDbDict, self).__getattribute__(key)
+    # Every method that changes the dict stores it back in the object.
+    def _store(self) -> None:
+        setattr(self._obj, self._obj_name, self)
 
     def __setitem__(self, key: _KT, item: _VT) -> None:
         super(SakDbDict, self).__setitem__(key, item)
-        setattr(self._obj, self._obj_name, self)
+        self._store()
 
     def __delitem__(self, key: _KT) -> None:
         super(SakDbDict, self).__delitem__(key)
-        setattr(self._obj, self._obj_name, self)
+        self._store()
+
+    def clear(self) -> None:
+        super(SakDbDict, self).clear()
+        self._store()
+
+    def update(self, *args: Any, **vargs: Any) -> None:
+        super(SakDbDict, self).update(*args, **vargs)
+        self._store()
+
+    def pop(self, key: _KT, *args: Any) -> Any:
+        ret = super(SakDbDict, self).pop(key, *args)
+        self._store()
+        return ret
 
 
 class SakDbObject(object):
@@ -848,9 +1157,13 @@ class SakDbObject(object):
     def __init__(
         self, namespace: "SakDbNamespace", key: Optional[str] = None, **kwargs: Any
     ) -> None:
+        # Decoded scalar values and the field they were decoded from.
+        self._values_cache: Dict[str, Tuple[SakDbField, Any]] = {}
+
         self.namespace = namespace
         if key is None:
-            self.key = uuid.uuid4().hex
+            # Same 32 random hex digits as uuid4().hex, without the UUID object.
+            self.key = os.urandom(16).hex()
         else:
             self.key = key
 
@@ -858,31 +1171,61 @@ class SakDbObject(object):
 
         self._save()
 
+        # Store all the attributes at once, instead of updating the metadata
+        # once for each of them. Only possible if setattr would do the same,
+        # i.e. no custom __setattr__ and no property (or other data descriptor).
+        attributes = {}
         for name, value in kwargs.items():
-            setattr(self, name, value)
+            if (
+                name.startswith("_")
+                or (name in ["namespace", "key"])
+                or not self._is_plain_attribute(name)
+            ):
+                setattr(self, name, value)
+            else:
+                attributes[name] = value
+
+        if attributes:
+            self._set_attributes(attributes)
+
+    def _is_plain_attribute(self, name: str) -> bool:
+        cl = type(self)
+        if cl.__setattr__ is not SakDbObject.__setattr__:
+            return False
+
+        class_attr = getattr(cl, name, None)
+        return not (
+            hasattr(type(class_attr), "__set__")
+            or hasattr(type(class_attr), "__delete__")
+        )
 
     def _save(self) -> None:
         cl_payload = type(self).__name__
+        cl_saved = self.namespace._cl_saved
+        if cl_saved.get(self.key) == cl_payload:
+            return
+
         cl_fields = SakDbFields(SakDbField(key="_cl", payload=cl_payload))
 
-        previous_data = self.namespace.read(self.key, "_cl")
+        previous_data = self.namespace.read(self.key, "_cl", copy=False)
         if previous_data is not None:
             _cl_field = previous_data.get_by_key("_cl")
             if _cl_field is not None:
                 if _cl_field.payload == cl_payload:
+                    cl_saved[self.key] = cl_payload
                     return
 
         self.namespace.write(self.key, "_cl", cl_fields)
+        cl_saved[self.key] = cl_payload
 
     def __internal_getattribute__(
         self, name: str, data: SakDbFields, graph: SakDbGraph
     ) -> Any:
-        decoder = SakDbDecoder(graph)
+        decoder = graph.decoder
 
         type_field = data.get_by_key(f"_{name}:type")
         if type_field is None:
             raise Exception(f"Could not infere the type for {name}.")
-            return None
 
         if type_field.payload == "list":
             # If the type is a list.
@@ -892,7 +1235,7 @@ class SakDbObject(object):
                 if not field.key.startswith(f"{name}:"):
                     continue
 
-                value = json.loads(field.payload, object_hook=decoder.object_hook)
+                value = decoder.decode(field.payload)
                 tmp_list.append(value)
 
             return SakDbList(self, name, tmp_list)
@@ -905,7 +1248,7 @@ class SakDbObject(object):
                 if not field.key.startswith(f"{name}:"):
                     continue
 
-                value = json.loads(field.payload, object_hook=decoder.object_hook)
+                value = decoder.decode(field.payload)
 
                 _, field_key = field.key.split(":", 1)
                 tmp_dict[field_key] = value
@@ -917,9 +1260,18 @@ class SakDbObject(object):
 
             if object_field is None:
                 raise Exception(f"No attribute {name} for {self}.")
-                return None
 
-            value = json.loads(object_field.payload, object_hook=decoder.object_hook)
+            # The parsed fields are kept while the blob doesn't change, so the
+            # same field means the same value.
+            cached = self._values_cache.get(name)
+            if cached is not None and cached[0] is object_field:
+                return cached[1]
+
+            value = decoder.decode(object_field.payload)
+
+            # Only immutable values can be shared between the readers.
+            if value is None or isinstance(value, (bool, int, float, str)):
+                self._values_cache[name] = (object_field, value)
             return value
 
     def __getattribute__(self, name: str) -> Any:
@@ -928,7 +1280,7 @@ class SakDbObject(object):
 
         metadata_file = "meta"
 
-        data = self.namespace.read(self.key, metadata_file)
+        data = self.namespace.read(self.key, metadata_file, copy=False)
 
         if data is None:
             raise Exception(f"{self} has no attribute {metadata_file}.")
@@ -948,66 +1300,75 @@ class SakDbObject(object):
                     self.__setattr__(name, ret)
             return self.__getattribute__(name)
 
-    def __setattr__(self, name: str, value: Any) -> None:
-        if name.startswith("_") or (name in ["namespace", "key"]):
-            super(SakDbObject, self).__setattr__(name, value)
-            return
+    def _attribute_fields(
+        self, name: str, value: Any, encoder: "SakDbEncoder", ts: float
+    ) -> List[SakDbField]:
+        fields = []
 
-        try:
-            super(SakDbObject, self).__setattr__(name, value)
+        if isinstance(value, list):
+            fields.append(SakDbField(key=f"_{name}:type", payload="list", ts=ts))
 
-            if self.namespace.graph is None:
-                raise Exception(
-                    f"Namespace {self.namespace.name} must be attached to a graph."
+            for idx, ivalue in enumerate(value):
+                payload_str = encoder.encode(ivalue)
+                fields.append(
+                    SakDbField(key=f"{name}:{str(idx)}", payload=payload_str, ts=ts)
                 )
+        elif isinstance(value, dict):
+            fields.append(SakDbField(key=f"_{name}:type", payload="dict", ts=ts))
 
-            encoder = SakDbEncoder()
+            for ikey, ivalue in value.items():
+                payload_str = encoder.encode(ivalue)
+                fields.append(
+                    SakDbField(key=f"{name}:{ikey}", payload=payload_str, ts=ts)
+                )
+        else:
+            fields.append(
+                SakDbField(key=f"_{name}:type", payload=type(value).__name__, ts=ts)
+            )
 
-            fields = []
+            payload_str = encoder.encode(value)
+            fields.append(SakDbField(key=name, payload=payload_str, ts=ts))
 
-            if isinstance(value, list):
-                fields.append(SakDbField(key=f"_{name}:type", payload="list"))
+        return fields
 
-                for idx, ivalue in enumerate(value):
-                    payload_str = json.dumps(
-                        ivalue, default=encoder.default, separators=(",", ":")
-                    )
-                    fields.append(
-                        SakDbField(key=f"{name}:{str(idx)}", payload=payload_str)
-                    )
-            elif isinstance(value, dict):
-                fields.append(SakDbField(key=f"_{name}:type", payload="dict"))
+    def _set_attributes(self, attributes: Dict[str, Any]) -> None:
+        if self.namespace.graph is None:
+            raise Exception(
+                f"Namespace {self.namespace.name} must be attached to a graph."
+            )
 
-                for ikey, ivalue in value.items():
-                    payload_str = json.dumps(
-                        ivalue, default=encoder.default, separators=(",", ":")
-                    )
-                    fields.append(SakDbField(key=f"{name}:{ikey}", payload=payload_str))
-            else:
-                fields.append(
-                    SakDbField(key=f"_{name}:type", payload=type(value).__name__)
-                )
+        # All the fields of a write share the same timestamp.
+        ts = field_timestamp()
+        encoder = self.namespace.graph.encoder
 
-                payload_str = json.dumps(
-                    value, default=encoder.default, separators=(",", ":")
-                )
-                fields.append(SakDbField(key=name, payload=payload_str))
+        fields: List[SakDbField] = []
+        for name, value in attributes.items():
+            super(SakDbObject, self).__setattr__(name, value)
+            fields += self._attribute_fields(name, value, encoder, ts)
 
-            metadata_file = "meta"
-            data = SakDbFields(*fields)
+        metadata_file = "meta"
+        data = SakDbFields(_fields=fields)
 
-            previous_data = self.namespace.read(self.key, metadata_file)
-            if previous_data is not None:
+        previous_data = self.namespace.read(self.key, metadata_file)
+        if previous_data is not None:
+            prefixes: List[str] = []
+            for name in attributes:
                 # TODO(witt): Maybe it is not necessary to drop the _{name}:type.
-                previous_data.drop_by_key_prefix(f"_{name}:type")
-                previous_data.drop_by_key_prefix(f"{name}:")
-                new_data = merge(None, data, previous_data)
-            else:
-                new_data = data
+                prefixes.append(f"_{name}:type")
+                prefixes.append(f"{name}:")
+            previous_data.drop_by_key_prefix(tuple(prefixes))
+            new_data = merge(None, data, previous_data)
+        else:
+            new_data = data
+
+        self.namespace.write(self.key, metadata_file, new_data)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith("_") or (name in ["namespace", "key"]):
+            super(SakDbObject, self).__setattr__(name, value)
+            return
 
-            self.namespace.write(self.key, metadata_file, new_data)
-        except Exception as e:
-            raise (e)
+        self._set_attributes({name: value})
 
     def __getitem__(self, name: str) -> Any:
         return self.__getattribute__(name)
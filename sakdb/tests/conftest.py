@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+__author__ = "Fernando Witt"
+__credits__ = ["Fernando Witt"]
+
+__license__ = "MIT"
+__maintainer__ = "Fernando Witt"
+__email__ = "ferawitt@gmail.com"
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from sakdb.sakdb_storage import SakDbGraph, SakDbNamespaceGit
+
+# RAM backed file system, used for the temporary repositories when available.
+TMPFS_PATH = "/dev/shm"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tmpfs_tempdir() -> Iterator[None]:
+    # The tests create lots of small git objects, keep them out of the disk.
+    previous_tempdir = tempfile.tempdir
+    if os.path.isdir(TMPFS_PATH) and os.access(TMPFS_PATH, os.W_OK):
+        tempfile.tempdir = TMPFS_PATH
+
+    yield
+
+    tempfile.tempdir = previous_tempdir
+
+
+@pytest.fixture(scope="session")
+def template_repo(
+    tmpfs_tempdir: None, tmp_path_factory: pytest.TempPathFactory
+) -> Path:
+    # Repository with the initial commit and the version already stored.
+    path = tmp_path_factory.mktemp("template") / "repo"
+    SakDbNamespaceGit(SakDbGraph(), "data", path, "master")
+    return path
+
+
+@pytest.fixture
+def fresh_repo(template_repo: Path, tmp_path: Path) -> Path:
+    # Git never changes a file in place (objects are immutable and the other
+    # files are replaced on update), so the copy can share the files.
+    path = tmp_path / "repo"
+    shutil.copytree(template_repo, path, copy_function=os.link)
+    return path
@@ -8,10 +8,14 @@ __license__ = "MIT"
 __maintainer__ = "Fernando Witt"
 __email__ = "ferawitt@gmail.com"
 
+import json
+import sys
+
 from sakdb.sakdb_fields import (
     PAYLOAD_SEPARATOR,
     SakDbField,
     SakDbFields,
+    json_loads,
     merge,
     sakdb_dumps,
     sakdb_loads,
@@ -40,6 +44,29 @@ def test_dumps() -> None:
     )
 
 
+def test_dumps_matches_json() -> None:
+    # Given.
+    data = SakDbFields(
+        SakDbField(ts=1616074500.117626, key='a"b\\c', crc="md5:0", payload="é\n"),
+        SakDbField(ts=float("inf"), key="ünï", crc="md5:1", payload='"x"'),
+    )
+
+    # When.
+    data_str = sakdb_dumps(data)
+
+    # Then.
+    expected = ""
+    for field in data.fields:
+        header = {"t": field.ts, "k": field.key, "c": field.crc}
+        expected += (
+            json.dumps(header, separators=(",", ":"))
+            + PAYLOAD_SEPARATOR
+            + json.dumps(field.payload, separators=(",", ":"))
+            + "\n"
+        )
+    assert data_str == expected
+
+
 def test_loads() -> None:
     # Given.
     data = SakDbFields(
@@ -63,6 +90,82 @@ def test_loads() -> None:
     assert obj.fields[0].payload == "Hello world"
 
 
+def test_loads_interns_structural_keys() -> None:
+    # Given.
+    data = SakDbFields(
+        SakDbField(ts=1.0, key="".join(["_my_dict", ":type"]), payload="dict"),
+        SakDbField(ts=1.0, key="".join(["my_dict", ":user key"]), payload="1"),
+    )
+    data_str = sakdb_dumps(data)
+
+    # When.
+    obj = sakdb_loads(data_str)
+
+    # Then.
+    assert obj is not None
+    type_key, item_key = obj.get_keys()
+    assert sys.intern(type_key) is type_key
+    assert sys.intern("".join(["my_dict", ":user key"])) is not item_key
+
+
+def test_field_interns_structural_keys() -> None:
+    # When.
+    type_field = SakDbField(key="".join(["_my_list", ":type"]), payload="list")
+    item_field = SakDbField(key="".join(["my_list", ":0"]), payload="1")
+
+    # Then.
+    assert sys.intern("_my_list:type") is type_field.key
+    assert sys.intern("my_list:0") is not item_field.key
+
+
+def test_json_loads_non_strict() -> None:
+    # Given.
+    big_int = str(2**70)
+
+    # When.
+    nan = json_loads("NaN")
+    value = json_loads(big_int)
+
+    # Then.
+    assert nan != nan
+    assert value == 2**70
+
+
+def test_drop_by_key_prefix() -> None:
+    # Given.
+    data = SakDbFields(
+        SakDbField(key="_my_list:type", payload="list"),
+        SakDbField(key="my_list:0", payload="1"),
+        SakDbField(key="my_int", payload="42"),
+    )
+    assert data.get_by_key("my_list:0") is not None
+
+    # When.
+    data.drop_by_key_prefix("my_list:")
+
+    # Then.
+    assert data.get_keys() == ["_my_list:type", "my_int"]
+    assert data.get_by_key("my_list:0") is None
+    assert data.get_by_key("my_int") is not None
+
+
+def test_drop_by_key_prefixes() -> None:
+    # Given.
+    data = SakDbFields(
+        SakDbField(key="_my_list:type", payload="list"),
+        SakDbField(key="my_list:0", payload="1"),
+        SakDbField(key="_my_int:type", payload="int"),
+        SakDbField(key="my_int", payload="42"),
+        SakDbField(key="my_string", payload="hey"),
+    )
+
+    # When.
+    data.drop_by_key_prefix(("_my_list:type", "my_list:", "_my_int:type"))
+
+    # Then.
+    assert data.get_keys() == ["my_int", "my_string"]
+
+
 def test_merge_no_common_base() -> None:
 
     ours_data = (
@@ -80,3 +183,22 @@ def test_merge_no_common_base() -> None:
     merged = merge(None, ours, theirs)
 
     assert len(merged.fields) == 1
+
+
+def test_merge_same_fields() -> None:
+    # Given.
+    ours = SakDbFields(
+        SakDbField(ts=2.0, key="b", payload="2"),
+        SakDbField(ts=1.0, key="a", payload="1"),
+    )
+    theirs = SakDbFields(
+        SakDbField(ts=1.0, key="a", payload="1"),
+        SakDbField(ts=2.0, key="b", payload="2"),
+    )
+
+    # When.
+    merged = merge(None, ours, theirs)
+
+    # Then.
+    assert merged.get_keys() == ["a", "b"]
+    assert sakdb_dumps(merged) == sakdb_dumps(theirs)
@@ -8,14 +8,23 @@ __license__ = "MIT"
 __maintainer__ = "Fernando Witt"
 __email__ = "ferawitt@gmail.com"
 
+import json
+import shutil
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Type
 
+import pygit2
 import pytest
 
-from sakdb.sakdb_storage import VERSION, SakDbGraph, SakDbNamespaceGit, SakDbObject
+from sakdb.sakdb_storage import (
+    VERSION,
+    SakDbEncoder,
+    SakDbGraph,
+    SakDbNamespaceGit,
+    SakDbObject,
+)
 
 
 class DBObjectInt(SakDbObject):
@@ -34,6 +43,15 @@ class DBObjectList(SakDbObject):
     my_list: List[int]
 
 
+class DBObjectPositive(SakDbObject):
+    my_int: int
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "my_int" and value < 0:
+            raise ValueError(f"{name} must be positive")
+        super(DBObjectPositive, self).__setattr__(name, value)
+
+
 class DBObjectTwoFields(SakDbObject):
     my_bool: bool
     my_string: str
@@ -44,8 +62,20 @@ def run(cmd: List[str], cwd: str) -> None:
 
 
 def run_getoutput(cmd: List[str], cwd: str) -> str:
-    p = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, cwd=cwd)
-    return p.stdout.strip().decode("utf-8")
+    p = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=cwd)
+    return p.stdout.strip()
+
+
+def test_encoder_matches_json() -> None:
+    # Given.
+    encoder = SakDbEncoder()
+    values = [0, -5, 2**70, True, False, None, 1.5, "é", [1, True], {"a": None}]
+
+    # When.
+    encoded = [encoder.encode(v) for v in values]
+
+    # Then.
+    assert encoded == [json.dumps(v, separators=(",", ":")) for v in values]
 
 
 def test_create_repository() -> None:
@@ -63,7 +93,7 @@ def test_create_repository() -> None:
 def test_already_created_repository() -> None:
     # Given.
     with tempfile.TemporaryDirectory() as tmpdirname:
-        subprocess.run(["git", "init", tmpdirname], check=True)
+        pygit2.init_repository(tmpdirname, bare=False)
 
         # When.
         g = SakDbGraph()
@@ -73,459 +103,734 @@ def test_already_created_repository() -> None:
         assert n.repo.is_bare is False
 
 
-def test_repository_version() -> None:
+def test_register_class() -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g = SakDbGraph()
-        n = SakDbNamespaceGit(g, "data", Path(tmpdirname), "master")
+    g = SakDbGraph()
+    g.register_class(DBObjectInt)
+
+    class DBObjectIntOther(SakDbObject):
+        pass
+
+    DBObjectIntOther.__name__ = DBObjectInt.__name__
+
+    # When.
+    g.register_class(DBObjectInt)
+
+    # Then.
+    assert g.get_class("DBObjectInt") is DBObjectInt
+    with pytest.raises(Exception):
+        g.register_class(DBObjectIntOther)
+
+
+def test_repository_is_shared(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    # When.
+    n_config = SakDbNamespaceGit(g_a, "config", fresh_repo, "config")
+
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+
+    # Then.
+    assert n_config.repo is n_a.repo
+    assert n_b.repo is not n_a.repo
+
+
+def test_repository_version(fresh_repo: Path) -> None:
+    # Given.
+    g = SakDbGraph()
+    n = SakDbNamespaceGit(g, "data", fresh_repo, "master")
+
+    # When.
+    version = n.get_version()
+
+    # Then.
+    assert version == VERSION
+
+
+def test_repository_version_compatibility(fresh_repo: Path) -> None:
+    # Given.
+    g = SakDbGraph()
+    n = SakDbNamespaceGit(g, "data", fresh_repo, "master")
+
+    # When.
+    ret1 = n._validate_version(".".join([str(int(x) + 1) for x in VERSION.split(".")]))
+    ret2 = n._validate_version(VERSION)
+    ret3 = n._validate_version(
+        ".".join([str(min(int(x) - 1, 0)) for x in VERSION.split(".")])
+    )
+
+    # Then.
+    assert ret1 is False
+    assert ret2 is True
+    assert ret3 is True
+
+
+def test_int_increment(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
+
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+
+    assert a.my_int == 42
+
+    # When.
+    with g_a.session():
+        a.my_int += 1
+
+    # Then.
+    assert a.my_int == 43
+
+
+def test_rollback(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
 
+    with g_a.session():
         # When.
-        version = n.get_version()
+        a = DBObjectInt(n_a, my_int=42)
 
         # Then.
-        assert version == VERSION
+        assert a.my_int == 42
 
+    assert a.my_int == 42
 
-def test_repository_version_compatibility() -> None:
-    # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g = SakDbGraph()
-        n = SakDbNamespaceGit(g, "data", Path(tmpdirname), "master")
+    with g_a.session() as s:
+        # When.
+        a.my_int = 11
+
+        # Then.
+        assert a.my_int == 11
 
         # When.
-        ret1 = n._validate_version(
-            ".".join([str(int(x) + 1) for x in VERSION.split(".")])
-        )
-        ret2 = n._validate_version(VERSION)
-        ret3 = n._validate_version(
-            ".".join([str(min(int(x) - 1, 0)) for x in VERSION.split(".")])
-        )
+        s.rollback()
 
         # Then.
-        assert ret1 is False
-        assert ret2 is True
-        assert ret3 is True
+        assert a.my_int == 42
+
+    assert a.my_int == 42
 
 
-def test_int_increment() -> None:
+def test_rollback_after_commit(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectInt)
+    g_a.register_class(DBObjectInt)
 
-        with g_a.session():
-            a = DBObjectInt(n_a, my_int=42)
+    with g_a.session():
+        # When.
+        a = DBObjectInt(n_a, my_int=42)
 
+        # Then.
         assert a.my_int == 42
 
+    assert a.my_int == 42
+
+    with g_a.session() as s:
         # When.
-        with g_a.session():
-            a.my_int += 1
+        a.my_int = 11
+        s.commit()
 
         # Then.
-        assert a.my_int == 43
+        assert a.my_int == 11
 
+        # When.
+        s.rollback()
 
-def test_rollback() -> None:
-    # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+        # Then.
+        assert a.my_int == 42
 
-        g_a.register_class(DBObjectInt)
+    assert a.my_int == 42
 
-        with g_a.session():
-            # When.
-            a = DBObjectInt(n_a, my_int=42)
 
-            # Then.
-            assert a.my_int == 42
+def test_rollback_exception_in_session(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
+    g_a.register_class(DBObjectInt)
+
+    with g_a.session():
+        # When.
+        a = DBObjectInt(n_a, my_int=42)
+
+        # Then.
         assert a.my_int == 42
 
+    assert a.my_int == 42
+
+    with pytest.raises(Exception):
         with g_a.session() as s:
             # When.
             a.my_int = 11
+            s.commit()
 
             # Then.
             assert a.my_int == 11
 
             # When.
-            s.rollback()
+            raise Exception("Something really bad happened.")
 
-            # Then.
-            assert a.my_int == 42
+    # Then.
+    assert a.my_int == 42
 
-        assert a.my_int == 42
 
+def test_rollback_object_class(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
+
+    with g_a.session() as s:
+        a = DBObjectInt(n_a, my_int=42)
+        s.rollback()
+
+    assert n_a.read(a.key, "_cl") is None
 
-def test_rollback_after_commit() -> None:
+    # When.
+    with g_a.session():
+        DBObjectInt(n_a, a.key, my_int=11)
+
+    # Then.
+    assert n_a.read(a.key, "_cl") is not None
+
+
+def test_read_is_not_shared(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
+
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+
+    # When.
+    data = n_a.read(a.key, "meta")
+    assert data is not None
+    data.drop_by_key_prefix("my_int")
+
+    # Then.
+    data = n_a.read(a.key, "meta")
+    assert data is not None
+    assert data.get_by_key("my_int") is not None
+    assert a.my_int == 42
+
+
+def test_constructor_uses_setattr(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectPositive)
 
-        g_a.register_class(DBObjectInt)
+    # When.
+    with g_a.session():
+        a = DBObjectPositive(n_a, my_int=42)
 
+    # Then.
+    assert a.my_int == 42
+    with pytest.raises(ValueError):
         with g_a.session():
-            # When.
-            a = DBObjectInt(n_a, my_int=42)
+            DBObjectPositive(n_a, my_int=-1)
 
-            # Then.
-            assert a.my_int == 42
 
-        assert a.my_int == 42
+def test_consecutive_sessions(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        with g_a.session() as s:
-            # When.
-            a.my_int = 11
-            s.commit()
+    g_a.register_class(DBObjectInt)
 
-            # Then.
-            assert a.my_int == 11
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
 
-            # When.
-            s.rollback()
+    # When.
+    with g_a.session():
+        a.my_int += 1
+        b = DBObjectInt(n_a, my_int=1)
 
-            # Then.
-            assert a.my_int == 42
+    with g_a.session():
+        b.my_int += 1
+        c = DBObjectInt(n_a, my_int=7)
 
-        assert a.my_int == 42
+    # Then.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+    g_b.register_class(DBObjectInt)
+
+    assert n_b.get_object_keys() == {a.key, b.key, c.key}
+    assert DBObjectInt(n_b, a.key).my_int == 43
+    assert DBObjectInt(n_b, b.key).my_int == 2
+    assert DBObjectInt(n_b, c.key).my_int == 7
 
 
-def test_rollback_exception_in_session() -> None:
+def test_session_index_concurrent_writer(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+    g_a.register_class(DBObjectInt)
 
-        g_a.register_class(DBObjectInt)
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+    g_b.register_class(DBObjectInt)
 
-        with g_a.session():
-            # When.
-            a = DBObjectInt(n_a, my_int=42)
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=1)
 
-            # Then.
-            assert a.my_int == 42
+    # When.
+    with g_a.session():
+        a.my_int = 2
 
-        assert a.my_int == 42
+        # Another writer moves the namespace branch during the session.
+        with g_b.session():
+            DBObjectInt(n_b, "b" * 32, my_int=3)
 
-        with pytest.raises(Exception):
-            with g_a.session() as s:
-                # When.
-                a.my_int = 11
-                s.commit()
+    with g_a.session():
+        a.my_int = 4
 
-                # Then.
-                assert a.my_int == 11
+    # Then.
+    g_c = SakDbGraph()
+    n_c = SakDbNamespaceGit(g_c, "data", fresh_repo, "master")
+    g_c.register_class(DBObjectInt)
 
-                # When.
-                raise Exception("Something really bad happened.")
+    assert n_c.get_object_keys() == {a.key, "b" * 32}
+    assert DBObjectInt(n_c, "b" * 32).my_int == 3
+    assert DBObjectInt(n_c, a.key).my_int == 4
 
-        # Then.
-        assert a.my_int == 42
 
+def test_unchanged_write_does_not_commit(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
 
-def test_two_fields() -> None:
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+    head = n_a.repo.references[n_a.namespace_ref].target
+
+    # When.
+    with g_a.session():
+        a.my_int = 42
+
+    # Then.
+    assert n_a.repo.references[n_a.namespace_ref].target == head
+    assert a.my_int == 42
+
+
+def test_contains_object(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectTwoFields)
+    g_a.register_class(DBObjectInt)
 
-        with g_a.session():
-            # When.
-            a = DBObjectTwoFields(n_a)
-            a.my_int = 11
-            a.my_string = "foo"
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
 
-            # Then.
-            assert a.my_int == 11
-            assert a.my_string == "foo"
+    # When.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
 
-        assert a.my_int == 11
-        assert a.my_string == "foo"
+    # Then.
+    assert n_b.contains_object(a.key) is True
+    assert n_b.contains_object("0" * 32) is False
+    assert n_b.has_object("ab") is False
+    assert n_b.has_object("") is False
+    assert n_b.has_object("0" * 32) is False
+    assert n_b.objects == {}
 
 
-def test_write_a_read_b_int() -> None:
+def test_object_keys(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectInt)
+    g_a.register_class(DBObjectInt)
 
-        with g_a.session() as _:
-            a = DBObjectInt(n_a, my_int=42)
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=1)
+        b = DBObjectInt(n_a, my_int=2)
 
-        # When.
-        g_b = SakDbGraph()
-        g_b.register_class(DBObjectInt)
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+    keys_before = n_b.get_object_keys()
 
-        with g_b.session() as _:
-            n_b = SakDbNamespaceGit(g_b, "data", Path(tmpdirname), "master")
-            b = DBObjectInt(n_b, a.key)
+    # When.
+    with g_a.session():
+        c = DBObjectInt(n_a, my_int=3)
 
-        # Then.
-        assert a.my_int == 42
-        assert b.my_int == 42
+    # Then.
+    assert keys_before == {a.key, b.key}
+    assert n_b.get_object_keys() == {a.key, b.key, c.key}
 
 
-def test_write_a_read_b_string() -> None:
+def test_get_populated_object(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectString)
+    g_a.register_class(DBObjectInt)
 
-        with g_a.session():
-            a = DBObjectString(n_a, my_string="helloWorld")
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=1)
 
-        # When.
-        g_b = SakDbGraph()
-        n_b = SakDbNamespaceGit(g_b, "data", Path(tmpdirname), "master")
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+    g_b.register_class(DBObjectInt)
+    n_b.populate_object_keys()
 
-        g_b.register_class(DBObjectString)
+    # When.
+    b = n_b.get_object(a.key)
 
-        b = DBObjectString(n_b, a.key)
+    # Then.
+    assert n_b.objects[a.key] is b
+    assert n_b.get_object(a.key) is b
 
-        # Then.
-        assert a.my_string == "helloWorld"
-        assert b.my_string == "helloWorld"
 
+def test_graph_get_object(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectInt)
 
-def test_string_append() -> None:
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+
+    # When.
+    obj = g_a.get_object(a.key)
+
+    # Then.
+    assert obj is a
+
+
+def test_object_reference(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectString)
+    g_a.register_class(DBObjectInt)
+    g_a.register_class(DBObjectDict)
 
-        with g_a.session():
-            a = DBObjectString(n_a, my_string="helloWorld")
+    # When.
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+        b = DBObjectDict(n_a, my_dict={"refs": [a, {"obj": a}]})
 
-        assert a.my_string == "helloWorld"
+    # Then.
+    assert b.my_dict["refs"][0] is a
+    assert b.my_dict["refs"][1]["obj"] is a
 
+
+def test_two_fields(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectTwoFields)
+
+    with g_a.session():
         # When.
-        with g_a.session():
-            a.my_string += "!"
+        a = DBObjectTwoFields(n_a)
+        a.my_int = 11
+        a.my_string = "foo"
 
         # Then.
-        assert a.my_string == "helloWorld!"
+        assert a.my_int == 11
+        assert a.my_string == "foo"
+
+    assert a.my_int == 11
+    assert a.my_string == "foo"
 
 
-def test_wrwite_a_read_b_list() -> None:
+def test_write_a_read_b_int(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectList)
+    g_a.register_class(DBObjectInt)
 
-        with g_a.session():
-            a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
+    with g_a.session() as _:
+        a = DBObjectInt(n_a, my_int=42)
 
-        # When.
-        g_b = SakDbGraph()
-        n_b = SakDbNamespaceGit(g_b, "data", Path(tmpdirname), "master")
+    # When.
+    g_b = SakDbGraph()
+    g_b.register_class(DBObjectInt)
 
-        g_b.register_class(DBObjectList)
+    with g_b.session() as _:
+        n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+        b = DBObjectInt(n_b, a.key)
 
-        b = DBObjectList(n_b, a.key)
+    # Then.
+    assert a.my_int == 42
+    assert b.my_int == 42
 
-        # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert len(a.my_list) == 4
 
-        assert b.my_list[0] == 2
-        assert b.my_list[1] == 3
-        assert b.my_list[2] == 1
-        assert b.my_list[3] == 5
-        assert len(b.my_list) == 4
+def test_read_after_external_write(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+    g_a.register_class(DBObjectInt)
+
+    with g_a.session():
+        a = DBObjectInt(n_a, my_int=42)
+    assert a.my_int == 42
+
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+    g_b.register_class(DBObjectInt)
+    b = DBObjectInt(n_b, a.key)
 
+    # When.
+    with g_b.session():
+        b.my_int = 43
 
-def test_list_editions() -> None:
+    # Then.
+    assert a.my_int == 43
+
+
+def test_write_a_read_b_string(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectList)
+    g_a.register_class(DBObjectString)
 
-        with g_a.session():
-            a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
+    with g_a.session():
+        a = DBObjectString(n_a, my_string="helloWorld")
 
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert len(a.my_list) == 4
+    # When.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
 
-        # When.
-        with g_a.session():
-            a.my_list.append(42)
+    g_b.register_class(DBObjectString)
 
-        # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert a.my_list[4] == 42
-        assert len(a.my_list) == 5
+    b = DBObjectString(n_b, a.key)
 
-        # When.
-        with g_a.session():
-            a.my_list += [100]
+    # Then.
+    assert a.my_string == "helloWorld"
+    assert b.my_string == "helloWorld"
 
-        # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert a.my_list[4] == 42
-        assert a.my_list[5] == 100
-        assert len(a.my_list) == 6
 
-        # When.
-        with g_a.session():
-            a.my_list[5] = 101
+def test_string_append(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert a.my_list[4] == 42
-        assert a.my_list[5] == 101
-        assert len(a.my_list) == 6
+    g_a.register_class(DBObjectString)
+
+    with g_a.session():
+        a = DBObjectString(n_a, my_string="helloWorld")
+
+    assert a.my_string == "helloWorld"
+
+    # When.
+    with g_a.session():
+        a.my_string += "!"
 
+    # Then.
+    assert a.my_string == "helloWorld!"
 
-def test_write_a_read_b_dict() -> None:
+
+def test_wrwite_a_read_b_list(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectDict)
+    g_a.register_class(DBObjectList)
 
-        with g_a.session():
-            a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
+    with g_a.session():
+        a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
 
-        # When.
-        g_b = SakDbGraph()
-        n_b = SakDbNamespaceGit(g_b, "data", Path(tmpdirname), "master")
+    # When.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
 
-        g_b.register_class(DBObjectDict)
+    g_b.register_class(DBObjectList)
 
-        b = DBObjectDict(n_b, a.key)
+    b = DBObjectList(n_b, a.key)
 
-        # Then.
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert len(a.my_dict) == 2
+    # Then.
+    assert a.my_list == [2, 3, 1, 5]
 
-        assert b.my_dict["foo"] == 1
-        assert b.my_dict["bar"] == "hey"
-        assert len(b.my_dict) == 2
+    assert b.my_list == [2, 3, 1, 5]
 
 
-def test_dict_edit() -> None:
+def test_list_editions(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectDict)
+    g_a.register_class(DBObjectList)
 
-        with g_a.session():
-            a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
+    with g_a.session():
+        a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
 
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert len(a.my_dict) == 2
+    assert a.my_list == [2, 3, 1, 5]
 
-        # When.
-        with g_a.session():
-            a.my_dict["hello"] = "world"
+    # When.
+    with g_a.session():
+        a.my_list.append(42)
 
-        # Then.
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert a.my_dict["hello"] == "world"
-        assert len(a.my_dict) == 3
+    # Then.
+    assert a.my_list == [2, 3, 1, 5, 42]
 
-        # When.
-        with g_a.session():
-            a.my_dict.pop("foo")
+    # When.
+    with g_a.session():
+        a.my_list += [100]
 
-        # Then.
-        assert a.my_dict["bar"] == "hey"
-        assert a.my_dict["hello"] == "world"
-        assert len(a.my_dict) == 2
+    # Then.
+    assert a.my_list == [2, 3, 1, 5, 42, 100]
 
-        # When.
-        with g_a.session():
-            a.my_dict.update({"one_float": 1.23, "one_bool": True})
+    # When.
+    with g_a.session():
+        a.my_list[5] = 101
 
-        # Then.
-        assert a.my_dict["one_float"] == 1.23
-        assert a.my_dict["one_bool"] is True
-        assert a.my_dict["bar"] == "hey"
-        assert a.my_dict["hello"] == "world"
-        assert len(a.my_dict) == 4
+    # Then.
+    assert a.my_list == [2, 3, 1, 5, 42, 101]
 
 
-def test_list_pop_middle() -> None:
+def test_write_a_read_b_dict(fresh_repo: Path) -> None:
     # Given.
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        g_a = SakDbGraph()
-        n_a = SakDbNamespaceGit(g_a, "data", Path(tmpdirname), "master")
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
 
-        g_a.register_class(DBObjectList)
+    g_a.register_class(DBObjectDict)
 
-        with g_a.session():
-            a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
+    with g_a.session():
+        a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
 
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 1
-        assert a.my_list[3] == 5
-        assert len(a.my_list) == 4
+    # When.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
 
-        # When.
-        with g_a.session():
-            a.my_list.pop(2)
+    g_b.register_class(DBObjectDict)
 
-        # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 3
-        assert a.my_list[2] == 5
-        assert len(a.my_list) == 3
+    b = DBObjectDict(n_b, a.key)
 
-        # When.
-        g_b = SakDbGraph()
-        n_b = SakDbNamespaceGit(g_b, "data", Path(tmpdirname), "master")
+    # Then.
+    assert a.my_dict == {"foo": 1, "bar": "hey"}
 
-        g_b.register_class(DBObjectList)
+    assert b.my_dict == {"foo": 1, "bar": "hey"}
 
-        b = DBObjectList(n_b, a.key)
 
-        # Then.
-        assert b.my_list[0] == 2
-        assert b.my_list[1] == 3
-        assert b.my_list[2] == 5
-        assert len(b.my_list) == 3
+def test_dict_edit(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectDict)
+
+    with g_a.session():
+        a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
+
+    assert a.my_dict == {"foo": 1, "bar": "hey"}
+
+    # When.
+    with g_a.session():
+        a.my_dict["hello"] = "world"
+
+    # Then.
+    assert a.my_dict == {"foo": 1, "bar": "hey", "hello": "world"}
+
+    # When.
+    with g_a.session():
+        a.my_dict.pop("foo")
+
+    # Then.
+    assert a.my_dict == {"bar": "hey", "hello": "world"}
+
+    # When.
+    with g_a.session():
+        a.my_dict.update({"one_float": 1.23, "one_bool": True})
+
+    # Then.
+    assert a.my_dict["one_float"] == 1.23
+    assert a.my_dict["one_bool"] is True
+    assert a.my_dict["bar"] == "hey"
+    assert a.my_dict["hello"] == "world"
+    assert len(a.my_dict) == 4
+
+
+def test_list_pop_middle(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectList)
+
+    with g_a.session():
+        a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
+
+    assert a.my_list == [2, 3, 1, 5]
+
+    # When.
+    with g_a.session():
+        a.my_list.pop(2)
+
+    # Then.
+    assert a.my_list == [2, 3, 5]
 
+    # When.
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
 
-def test_sync_string() -> None:
+    g_b.register_class(DBObjectList)
+
+    b = DBObjectList(n_b, a.key)
+
+    # Then.
+    assert b.my_list == [2, 3, 5]
+
+
+def test_list_del_item(fresh_repo: Path) -> None:
+    # Given.
+    g_a = SakDbGraph()
+    n_a = SakDbNamespaceGit(g_a, "data", fresh_repo, "master")
+
+    g_a.register_class(DBObjectList)
+
+    with g_a.session():
+        a = DBObjectList(n_a, my_list=[2, 3, 1, 5])
+
+    # When.
+    with g_a.session():
+        del a.my_list[1]
+
+    g_b = SakDbGraph()
+    n_b = SakDbNamespaceGit(g_b, "data", fresh_repo, "master")
+
+    g_b.register_class(DBObjectList)
+
+    b = DBObjectList(n_b, a.key)
+
+    # Then.
+    assert a.my_list == [2, 1, 5]
+    assert b.my_list == [2, 1, 5]
+
+
+@pytest.mark.parametrize(
+    "cl,attr,value",
+    [
+        (DBObjectString, "my_string", "helloWorld"),
+        (DBObjectList, "my_list", [2, 1, 3]),
+        (DBObjectDict, "my_dict", {"foo": 1, "bar": "hey"}),
+    ],
+)
+def test_sync(cl: Type[SakDbObject], attr: str, value: Any) -> None:
     with tempfile.TemporaryDirectory() as tmpdirname:
         # Given.
         dirA = Path(tmpdirname) / "dirA"
@@ -537,15 +842,15 @@ def test_sync_string() -> None:
         g_a = SakDbGraph()
         n_a = SakDbNamespaceGit(g_a, "data", Path(dirA), "master")
 
-        g_a.register_class(DBObjectString)
+        g_a.register_class(cl)
 
         with g_a.session():
-            a = DBObjectString(n_a, my_string="helloWorld")
+            a = cl(n_a, **{attr: value})
 
         g_b = SakDbGraph()
         n_b = SakDbNamespaceGit(g_b, "data", Path(dirB), "master")
 
-        g_b.register_class(DBObjectString)
+        g_b.register_class(cl)
 
         # When
         n_a.add_remote("origin", str(dirB))
@@ -554,56 +859,61 @@ def test_sync_string() -> None:
         n_a.sync()
         n_b.sync()
 
-        b = DBObjectString(n_b, a.key)
+        b = cl(n_b, a.key)
 
         # Then.
-        assert a.my_string == "helloWorld"
-        assert b.my_string == "helloWorld"
+        assert getattr(a, attr) == value
+        assert getattr(b, attr) == value
 
 
-def test_sync_list() -> None:
+def test_sync_two_remotes() -> None:
     with tempfile.TemporaryDirectory() as tmpdirname:
         # Given.
         dirA = Path(tmpdirname) / "dirA"
         dirB = Path(tmpdirname) / "dirB"
+        dirC = Path(tmpdirname) / "dirC"
 
         dirA.mkdir()
         dirB.mkdir()
+        dirC.mkdir()
 
         g_a = SakDbGraph()
         n_a = SakDbNamespaceGit(g_a, "data", Path(dirA), "master")
 
-        g_a.register_class(DBObjectList)
+        g_a.register_class(DBObjectString)
 
         with g_a.session():
-            a = DBObjectList(n_a, my_list=[2, 1, 3])
+            a = DBObjectString(n_a, my_string="helloWorld")
 
         g_b = SakDbGraph()
         n_b = SakDbNamespaceGit(g_b, "data", Path(dirB), "master")
 
-        g_b.register_class(DBObjectList)
+        g_b.register_class(DBObjectString)
+
+        g_c = SakDbGraph()
+        n_c = SakDbNamespaceGit(g_c, "data", Path(dirC), "master")
+
+        g_c.register_class(DBObjectString)
 
         # When
-        n_a.add_remote("origin", str(dirB))
+        n_a.add_remote("b", str(dirB))
+        n_a.add_remote("c", str(dirC))
         n_b.add_remote("origin", str(dirA))
+        n_c.add_remote("origin", str(dirA))
 
         n_a.sync()
         n_b.sync()
+        n_c.sync()
 
-        b = DBObjectList(n_b, a.key)
+        b = DBObjectString(n_b, a.key)
+        c = DBObjectString(n_c, a.key)
 
         # Then.
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 1
-        assert a.my_list[2] == 3
-
-        assert b.my_list[0] == 2
-        assert b.my_list[1] == 1
-        assert b.my_list[2] == 3
+        assert b.my_string == "helloWorld"
+        assert c.my_string == "helloWorld"
 
 
-def test_sync_dict() -> None:
-    # Given.
+def test_sync_recreated_remote() -> None:
     with tempfile.TemporaryDirectory() as tmpdirname:
         # Given.
         dirA = Path(tmpdirname) / "dirA"
@@ -615,32 +925,31 @@ def test_sync_dict() -> None:
         g_a = SakDbGraph()
         n_a = SakDbNamespaceGit(g_a, "data", Path(dirA), "master")
 
-        g_a.register_class(DBObjectDict)
+        g_a.register_class(DBObjectString)
 
         with g_a.session():
-            a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
+            DBObjectString(n_a, my_string="helloWorld")
 
-        g_b = SakDbGraph()
-        n_b = SakDbNamespaceGit(g_b, "data", Path(dirB), "master")
-        g_b.register_class(DBObjectDict)
+        SakDbNamespaceGit(SakDbGraph(), "data", Path(dirB), "master")
 
-        # When
         n_a.add_remote("origin", str(dirB))
-        n_b.add_remote("origin", str(dirA))
-
         n_a.sync()
-        n_b.sync()
 
-        b = DBObjectDict(n_b, a.key)
+        # When.
+        shutil.rmtree(dirB)
+        dirB.mkdir()
+        SakDbNamespaceGit(SakDbGraph(), "data", Path(dirB), "master")
 
-        # Then.
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert len(a.my_dict) == 2
+        n_a.sync()
 
-        assert b.my_dict["foo"] == 1
-        assert b.my_dict["bar"] == "hey"
-        assert len(b.my_dict) == 2
+        # Then.
+        repo_b = pygit2.Repository(str(dirB))
+        synced_ref = "refs/heads/synced/master"
+        assert synced_ref in repo_b.references
+        assert (
+            repo_b.references[synced_ref].target
+            == n_a.repo.references[synced_ref].target
+        )
 
 
 def test_sync_with_git_command_no_common_base() -> None:
@@ -706,10 +1015,7 @@ def test_sync_list_with_git_command_no_common_base() -> None:
         with g_a.session():
             a = DBObjectList(n_a, my_list=[2, 1, 3])
 
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 1
-        assert a.my_list[2] == 3
-        assert len(a.my_list) == 3
+        assert a.my_list == [2, 1, 3]
 
         # Add the same object/key in another object with my_list "fooBar".
         g_b = SakDbGraph()
@@ -719,11 +1025,7 @@ def test_sync_list_with_git_command_no_common_base() -> None:
         with g_b.session():
             b = DBObjectList(n_b, a.key, my_list=[5, 4, 6, 10])
 
-        assert b.my_list[0] == 5
-        assert b.my_list[1] == 4
-        assert b.my_list[2] == 6
-        assert b.my_list[3] == 10
-        assert len(b.my_list) == 4
+        assert b.my_list == [5, 4, 6, 10]
 
         # When
 
@@ -732,23 +1034,12 @@ def test_sync_list_with_git_command_no_common_base() -> None:
         n_b.add_remote("origin", str(dirA))
 
         # Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
-        assert a.my_list[0] == 5
-        assert a.my_list[1] == 4
-        assert a.my_list[2] == 6
-        assert a.my_list[3] == 10
-        assert len(a.my_list) == 4
+        assert a.my_list == [5, 4, 6, 10]
 
-        assert b.my_list[0] == 5
-        assert b.my_list[1] == 4
-        assert b.my_list[2] == 6
-        assert b.my_list[3] == 10
-        assert len(b.my_list) == 4
+        assert b.my_list == [5, 4, 6, 10]
 
 
 def test_sync_dict_with_git_command_no_common_base() -> None:
@@ -768,9 +1059,7 @@ def test_sync_dict_with_git_command_no_common_base() -> None:
         with g_a.session():
             a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
 
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert len(a.my_dict) == 2
+        assert a.my_dict == {"foo": 1, "bar": "hey"}
 
         # Add the same object/key in another object with my_dict "fooBar".
         g_b = SakDbGraph()
@@ -780,9 +1069,7 @@ def test_sync_dict_with_git_command_no_common_base() -> None:
         with g_b.session():
             b = DBObjectDict(n_b, a.key, my_dict={"foo": 2, "hello": "world"})
 
-        assert b.my_dict["foo"] == 2
-        assert b.my_dict["hello"] == "world"
-        assert len(b.my_dict) == 2
+        assert b.my_dict == {"foo": 2, "hello": "world"}
 
         # When
 
@@ -791,21 +1078,12 @@ def test_sync_dict_with_git_command_no_common_base() -> None:
         n_b.add_remote("origin", str(dirA))
 
         # Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
-        assert a.my_dict["foo"] == 2
-        assert a.my_dict["bar"] == "hey"
-        assert a.my_dict["hello"] == "world"
-        assert len(a.my_dict) == 3
+        assert a.my_dict == {"foo": 2, "bar": "hey", "hello": "world"}
 
-        assert b.my_dict["foo"] == 2
-        assert b.my_dict["bar"] == "hey"
-        assert b.my_dict["hello"] == "world"
-        assert len(b.my_dict) == 3
+        assert b.my_dict == {"foo": 2, "bar": "hey", "hello": "world"}
 
 
 def test_sync_with_git_command_common_base() -> None:
@@ -835,10 +1113,7 @@ def test_sync_with_git_command_common_base() -> None:
         # Link the repositories with remotes.
         n_a.add_remote("origin", str(dirB))
         n_b.add_remote("origin", str(dirA))
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         b = DBObjectString(n_b, a.key)
         assert b.my_string == "helloWorld"
@@ -851,10 +1126,7 @@ def test_sync_with_git_command_common_base() -> None:
             b.my_string = "changedB"
 
         # Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
         assert a.my_string == "changedB"
@@ -878,10 +1150,7 @@ def test_sync_list_with_git_command_common_base() -> None:
         with g_a.session():
             a = DBObjectString(n_a, my_list=[2, 1, 3])
 
-        assert a.my_list[0] == 2
-        assert a.my_list[1] == 1
-        assert a.my_list[2] == 3
-        assert len(a.my_list) == 3
+        assert a.my_list == [2, 1, 3]
 
         # Add the same object/key in another object with my_list "fooBar".
         g_b = SakDbGraph()
@@ -891,19 +1160,13 @@ def test_sync_list_with_git_command_common_base() -> None:
         # When - Link the repositories with remotes.
         n_a.add_remote("origin", str(dirB))
         n_b.add_remote("origin", str(dirA))
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
         with g_b.session():
             b = DBObjectList(n_b, a.key)
 
-        assert b.my_list[0] == 2
-        assert b.my_list[1] == 1
-        assert b.my_list[2] == 3
-        assert len(b.my_list) == 3
+        assert b.my_list == [2, 1, 3]
 
         # When.
         with g_a.session():
@@ -915,24 +1178,15 @@ def test_sync_list_with_git_command_common_base() -> None:
         # Then.
         assert len(a.my_list) == 0
 
-        assert b.my_list[0] == 1
-        assert b.my_list[1] == 2
-        assert len(b.my_list) == 2
+        assert b.my_list == [1, 2]
 
         # When - Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
-        assert a.my_list[0] == 1
-        assert a.my_list[1] == 2
-        assert len(a.my_list) == 2
+        assert a.my_list == [1, 2]
 
-        assert b.my_list[0] == 1
-        assert b.my_list[1] == 2
-        assert len(b.my_list) == 2
+        assert b.my_list == [1, 2]
 
         # When.
         with g_a.session():
@@ -942,31 +1196,17 @@ def test_sync_list_with_git_command_common_base() -> None:
             b.my_list = [11, 22]
 
         # Then.
-        assert a.my_list[0] == 3
-        assert a.my_list[1] == 4
-        assert a.my_list[2] == 5
-        assert len(a.my_list) == 3
+        assert a.my_list == [3, 4, 5]
 
-        assert b.my_list[0] == 11
-        assert b.my_list[1] == 22
-        assert len(b.my_list) == 2
+        assert b.my_list == [11, 22]
 
         # When - Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
-        assert a.my_list[0] == 11
-        assert a.my_list[1] == 22
-        assert a.my_list[2] == 5
-        assert len(a.my_list) == 3
+        assert a.my_list == [11, 22, 5]
 
-        assert b.my_list[0] == 11
-        assert b.my_list[1] == 22
-        assert b.my_list[2] == 5
-        assert len(b.my_list) == 3
+        assert b.my_list == [11, 22, 5]
 
 
 def test_sync_dict_with_git_command_common_base() -> None:
@@ -986,9 +1226,7 @@ def test_sync_dict_with_git_command_common_base() -> None:
         with g_a.session():
             a = DBObjectDict(n_a, my_dict={"foo": 1, "bar": "hey"})
 
-        assert a.my_dict["foo"] == 1
-        assert a.my_dict["bar"] == "hey"
-        assert len(a.my_dict) == 2
+        assert a.my_dict == {"foo": 1, "bar": "hey"}
 
         # Add the same object/key in another object with my_dict "fooBar".
         g_b = SakDbGraph()
@@ -1001,16 +1239,11 @@ def test_sync_dict_with_git_command_common_base() -> None:
         n_b.add_remote("origin", str(dirA))
 
         # Sync the repositories. The repo A is supposed to have trhe value from repo B now.
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
         b = DBObjectDict(n_b, a.key)
-        assert b.my_dict["foo"] == 1
-        assert b.my_dict["bar"] == "hey"
-        assert len(b.my_dict) == 2
+        assert b.my_dict == {"foo": 1, "bar": "hey"}
 
         # When.
         with g_a.session():
@@ -1018,16 +1251,9 @@ def test_sync_dict_with_git_command_common_base() -> None:
         with g_b.session():
             b.my_dict = {"foo": 3}
 
-        n_a.sync()
-        n_b.sync()
-        n_a.sync()
-        n_b.sync()
+        n_a.sync_bidir(n_b)
 
         # Then.
-        assert a.my_dict["foo"] == 3
-        assert a.my_dict["hello"] == "world"
-        assert len(a.my_dict) == 2
+        assert a.my_dict == {"foo": 3, "hello": "world"}
 
-        assert b.my_dict["foo"] == 3
-        assert b.my_dict["hello"] == "world"
-        assert len(b.my_dict) == 2
+        assert b.my_dict == {"foo": 3, "hello": "world"}
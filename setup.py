@@ -50,4 +50,5 @@ setup(
     ext_modules=[SakDbExtension("sakdb")],
     cmdclass=dict(build_ext=SakDbBuild),
     install_requires=["pygit2"],
+    extras_require={"fast": ["orjson"]},
 )